@@ -11,14 +11,101 @@ Jan 5, 2022
 import numpy as np
 from scipy.special import gamma as γ
 from scipy.special import gammaincc as γincc
-from scipy.special import erf
-from scipy.integrate import quad
+from scipy.special import erf, erfi
 from scipy.special import lambertw
+from scipy.integrate import quad_vec
 from iceotherm.lib.constants import constants
 
 from iceotherm.lib.ice_properties import *
 
-def Robin_T(m,T_bulk=None,const=constants(),melt=True,verbose=False):
+# Gauss-Legendre nodes and weights on (0,1) for the Perol and Rice (2015) integrals
+# The 64-point rule is accurate to ~1e-10 for Pe <= 800 (~1e-5 by Pe = 2000),
+# so above _Pe_gl Perol_T falls back to adaptive vector-valued quadrature
+_u_gl,_w_gl = np.polynomial.legendre.leggauss(64)
+_u_gl = .5*(_u_gl+1.)
+_w_gl = .5*_w_gl
+_Pe_gl = 800.
+
+def _gaussian_integral(z,q2):
+    """
+    Closed form for the integral of exp(-q2*z**2) from 0 to z,
+    used in place of a numerical quadrature at every depth
+
+    Parameters
+    ----------
+    z:          1-D array, Height above the bed
+    q2:         float, Exponent coefficient
+
+    Output
+    ----------
+    F:          1-D array, Integral evaluated at each z
+    """
+    if q2 > 0.:
+        s = np.sqrt(q2)
+        F = (np.sqrt(np.pi)/(2.*s))*erf(s*z)
+    elif q2 < 0.:
+        # negative accumulation (ablation) uses the imaginary error function
+        s = np.sqrt(-q2)
+        F = (np.sqrt(np.pi)/(2.*s))*erfi(s*z)
+    else:
+        F = np.array(z,dtype=float)
+    return F
+
+# ---------------------------------------------------
+
+class thermal_context(object):
+    """
+    Thermal constants shared between the analytical solutions
+
+    Built once for a model and passed to any of the solvers through their
+    ctx argument, so that comparisons between solutions do not recompute
+    the conductivity, heat capacity, and rate factor for the same T_bulk.
+    The context is tied to the model state at construction; rebuild it if
+    m is changed. The rate factor is only evaluated the first time A is used.
+
+    Parameters
+    ----------
+    m:              class,      Model
+    T_bulk:         float,      Temperature input to the property functions (C),
+                                'average' for the mean of the surface and
+                                melting temperatures, or None for constants
+    const:          class,      Constants
+    rate_factor:    function,   Calculate the rate factor from Glen's Flow Law
+    """
+    def __init__(self,m,T_bulk=None,const=constants(),rate_factor=rate_factor):
+        # Thermal constants
+        if T_bulk is None:
+            self.k = const.k
+            self.Cp = const.Cp
+        else:
+            if T_bulk == 'average':
+                T_bulk = (m.Ts+m.pmp[0])/2.
+            self.k = conductivity(T_bulk,const.rho)
+            self.Cp = heat_capacity(T_bulk)
+        self.T_bulk = T_bulk
+        self.const = const
+        self.rate_factor = rate_factor
+        self._A = None
+        self.alpha = self.k/(const.rho*self.Cp)
+        # Peclet Number
+        self.Pe = m.adot*m.H/self.alpha
+        # Robin (1955) exponent and geothermal gradient
+        self.q2 = m.adot/(2.*self.alpha*m.H)
+        self.Tb_grad = -m.qgeo/self.k
+
+    @property
+    def A(self):
+        """
+        Rate factor at T_bulk, None for constant properties where each
+        solver uses its own rate factor
+        """
+        if self.T_bulk is not None and self._A is None:
+            self._A = self.rate_factor(self.T_bulk,self.const)
+        return self._A
+
+# ---------------------------------------------------
+
+def Robin_T(m,T_bulk=None,const=constants(),melt=True,verbose=False,ctx=None):
     """
     Analytic ice temperature model from Robin (1955)
 
@@ -38,6 +125,7 @@ def Robin_T(m,T_bulk=None,const=constants(),melt=True,verbose=False):
                         is locked at the pressure melting point and melt rates
                         are calculated
     verbose:    bool, option to print all output
+    ctx:        class, optional thermal_context, overrides T_bulk
 
     Output
     ----------
@@ -46,26 +134,23 @@ def Robin_T(m,T_bulk=None,const=constants(),melt=True,verbose=False):
     """
 
     # Thermal constants
-    if T_bulk is None:
-        k = const.k
-        Cp = const.Cp
-    else:
-        if T_bulk == 'average':
-            T_bulk = np.mean([m.Ts,m.pmp[0]])
-        k = conductivity(T_bulk,const.rho)
-        Cp = heat_capacity(T_bulk)
-    alpha = k/(const.rho*Cp)
-
-    q2 = m.adot/(2*alpha*m.H)
-    Tb_grad = -m.qgeo/k
-    f = lambda z : np.exp(-(z**2.)*q2)
-    TTb = Tb_grad*np.array([quad(f,0,zi)[0] for zi in m.z])
+    if ctx is None:
+        ctx = thermal_context(m,T_bulk,const)
+    k = ctx.k
+    q2 = ctx.q2
+    Tb_grad = ctx.Tb_grad
+    # the depth integral does not depend on the basal gradient, so it is
+    # computed once and reused if the melt branch rescales the profile
+    F = _gaussian_integral(m.z,q2)
+    TTb = Tb_grad*F
     dTs = m.Ts - TTb[-1]
     T = TTb + dTs
     # recalculate if basal temperature is above melting (see van der Veen pg 148)
     if melt and T[0] > m.pmp[0]:
-        Tb_grad = -2.*np.sqrt(q2)*(m.pmp[0]-m.Ts)/np.sqrt(np.pi)*(np.sqrt(erf(m.adot*m.H/(2.*alpha)))**(-1))
-        TTb = Tb_grad*np.array([quad(f,0,zi)[0] for zi in m.z])
+        # F[-1] is the integral over the full thickness, sqrt(pi)/(2*sqrt(q2))*erf(sqrt(q2)*H),
+        # so this gradient puts the bed exactly at the melting point
+        Tb_grad = -(m.pmp[0]-m.Ts)/F[-1]
+        TTb = Tb_grad*F
         dTs = m.Ts - TTb[-1]
         T = TTb + dTs
         M = (Tb_grad + m.qgeo/k)*k/const.L
@@ -79,7 +164,7 @@ def Robin_T(m,T_bulk=None,const=constants(),melt=True,verbose=False):
 
 # ---------------------------------------------------
 
-def Rezvan_T(m,const=constants(),rate_factor=rate_factor,T_bulk=-10.,tau_dx=0.,verbose=False):
+def Rezvan_T(m,const=constants(),rate_factor=rate_factor,T_bulk=-10.,tau_dx=0.,verbose=False,ctx=None):
     """
     1-D Analytical temperature profile from Rezvanbehbahani et al. (2019)
     Main improvement from the Robin (1955) solution is the nonlinear vertical velocity profile
@@ -100,6 +185,7 @@ def Rezvan_T(m,const=constants(),rate_factor=rate_factor,T_bulk=-10.,tau_dx=0.,v
     tau_dx:         float,      Driving stress input directly (Pa)
     gamma_plus:     bool,       Optional, Determine gama_plus from the logarithmic regression with Pe Number
     verbose:        bool,       Print all output
+    ctx:            class,      Optional thermal_context, overrides T_bulk and rate_factor
 
     Output
     ----------
@@ -107,21 +193,15 @@ def Rezvan_T(m,const=constants(),rate_factor=rate_factor,T_bulk=-10.,tau_dx=0.,v
     """
 
     # Thermal constants
-    if T_bulk is None:
-        k = const.k
-        Cp = const.Cp
-        A = const.Astar
-    else:
-        if T_bulk == 'average':
-            T_bulk = np.mean([m.Ts,m.pmp[0]])
-        k = conductivity(T_bulk,const.rho)
-        Cp = heat_capacity(T_bulk)
-        A = rate_factor(T_bulk,const)
-    alpha = k/(const.rho*Cp)
+    if ctx is None:
+        ctx = thermal_context(m,T_bulk,const,rate_factor)
+    k = ctx.k
+    alpha = ctx.alpha
+    A = const.Astar if ctx.A is None else ctx.A
 
     if m.gamma is None:
         # Solve for gamma using the logarithmic regression with the Pe number
-        Pe = m.adot*m.H/alpha
+        Pe = ctx.Pe
         if Pe < 5. and verbose:
             print('Pe:',Pe)
             print('The gamma_plus fit is not well-adjusted for low Pe numbers.')
@@ -134,14 +214,19 @@ def Rezvan_T(m,const=constants(),rate_factor=rate_factor,T_bulk=-10.,tau_dx=0.,v
     qgeo_s = (2./5.)*A*m.H*tau_dx**4.
     qgeo = m.qgeo + qgeo_s
     # Rezvanbehbahani (2019) eq. (19)
+    gp1 = m.gamma+1.
     lamb = m.adot/(alpha*m.H**m.gamma)
-    phi = -lamb/(m.gamma+1)
+    phi = -lamb/gp1
 
-    # Rezvanbehbahani (2019) eq. (17)
-    Γ_1 = γincc(1/(1+m.gamma),-phi*m.z**(m.gamma+1))*γ(1/(1+m.gamma))
-    Γ_2 = γincc(1/(1+m.gamma),-phi*m.H**(m.gamma+1))*γ(1/(1+m.gamma))
-    term2 = Γ_1-Γ_2
-    T = m.Ts + m.qgeo*(-phi)**(-1./(m.gamma+1.))/(k*(m.gamma+1))*term2
+    # Rezvanbehbahani (2019) eq. (17), evaluated in place on a single depth array
+    a = 1./gp1
+    Γ_2 = γincc(a,-phi*m.H**gp1)
+    T = np.power(m.z,gp1)
+    T *= -phi
+    γincc(a,T,out=T)
+    T -= Γ_2
+    T *= γ(a)*m.qgeo*(-phi)**(-a)/(k*gp1)
+    T += m.Ts
     return T
 
 # ---------------------------------------------------
@@ -150,7 +235,7 @@ def Meyer_T(m,const=constants(),
             rate_factor=rate_factor,
             T_bulk='average',
             Tb=0.,lam=0.,
-            verbose=False):
+            verbose=False,ctx=None):
     """
     Meyer and Minchew (2018)
     A 1-D analytical model of temperate ice in shear margins
@@ -173,6 +258,7 @@ def Meyer_T(m,const=constants(),
     lam:            float,  Paramaterized horizontal advection term
                             Meyer and Minchew (2018) eq. 11
     verbose:        bool, option to print all output
+    ctx:            class, optional thermal_context, overrides T_bulk and rate_factor
 
     Output
     ----------
@@ -180,28 +266,23 @@ def Meyer_T(m,const=constants(),
     """
 
     # Thermal constants
-    if T_bulk is None:
-        k = const.k
-        Cp = const.Cp
-        # rate factor (Meyer uses 2.4e-24; Table 1)
-        A = 2.4e-24
-    else:
-        if T_bulk == 'average':
-            T_bulk = np.mean([m.Ts,m.pmp[0]])
-        k = conductivity(T_bulk,const.rho)
-        Cp = heat_capacity(T_bulk)
-        A = rate_factor(T_bulk,const)
-    alpha = k/(const.rho*Cp)
+    if ctx is None:
+        ctx = thermal_context(m,T_bulk,const,rate_factor)
+    k = ctx.k
+    # rate factor (Meyer uses 2.4e-24; Table 1)
+    A = 2.4e-24 if ctx.A is None else ctx.A
 
     # Brinkman Number
     S = 2.*A**(-1./const.n)*(m.eps_xy)**((const.n+1.)/const.n)
     dT = Tb - m.Ts
     Br = (S*m.H**2.)/(k*dT)
     # Peclet Number
-    Pe = (const.rho*Cp*m.adot*m.H)/(k)
+    Pe = ctx.Pe
     LAM = lam*m.H**2./(k*dT)
     if verbose:
         print('Meyer; Pe:', Pe,'Br:',Br)
+    # Normalized height above the bed, ice below hbar is temperate
+    zn = m.z/m.H
     # temperature solution is different for diffusion only vs. advection-diffusion
     if abs(Pe) < 1e-3:
         # Critical Shear Strain
@@ -212,8 +293,7 @@ def Meyer_T(m,const=constants(),
         else:
             hbar = 0.
         # Solve for the temperature profile
-        T = m.Ts + dT*(Br/2.)*(1.-((m.z/m.H)**2.)-2.*hbar*(1.-m.z/m.H))
-        T[m.z/m.H<hbar] = 0.
+        T = np.where(zn<hbar, 0., m.Ts + dT*(Br/2.)*(1.-zn)*(1.+zn-2.*hbar))
     else:
         # Critical Shear Strain
         eps_1 = (((0.5*Pe**2.)/(Pe-1.+np.exp(-Pe))+0.5*LAM)**(const.n/(const.n+1.)))
@@ -225,8 +305,7 @@ def Meyer_T(m,const=constants(),
             hbar = h_1 + h_2
         else:
             hbar = 0.
-        T = m.Ts + dT*((Br-LAM)/Pe)*(1.-m.z/m.H+(1./Pe)*np.exp(Pe*(hbar-1.))-(1./Pe)*np.exp(Pe*((hbar-m.z/m.H))))
-        T[m.z/m.H<hbar] = 0.
+        T = np.where(zn<hbar, 0., m.Ts + dT*((Br-LAM)/Pe)*(1.-zn+(np.exp(Pe*(hbar-1.))-np.exp(Pe*(hbar-zn)))/Pe))
     return T
 
 # ---------------------------------------------------
@@ -234,7 +313,7 @@ def Meyer_T(m,const=constants(),
 def Perol_T(m,const=constants(),
                 rate_factor=rate_factor,
                 T_bulk='average',
-                verbose=False):
+                verbose=False,ctx=None):
     """
     Perol and Rice (2015)
     Analytic Solution for temperate ice in shear margins (equation #5)
@@ -250,6 +329,7 @@ def Perol_T(m,const=constants(),
     rateFactor: func,   function for the rate factor, A in Glen's Law
     T_bulk      float, Temperature input to the rate factor function, A(T)
     verbose:    bool, option to print all output
+    ctx:        class, optional thermal_context, overrides T_bulk and rate_factor
 
     Output
     ----------
@@ -257,35 +337,32 @@ def Perol_T(m,const=constants(),
     """
 
     # Thermal constants
-    if T_bulk is None:
-        k = const.k
-        Cp = const.Cp
-        # rate factor (Meyer uses 2.4e-24; Table 1)
-        A = 2.4e-24
-    else:
-        if T_bulk == 'average':
-            T_bulk = np.mean([m.Ts,m.pmp[0]])
-        k = conductivity(T_bulk,const.rho)
-        Cp = heat_capacity(T_bulk)
-        A = rate_factor(T_bulk,const)
-    alpha = k/(const.rho*Cp)
+    if ctx is None:
+        ctx = thermal_context(m,T_bulk,const,rate_factor)
+    k = ctx.k
+    # rate factor (Meyer uses 2.4e-24; Table 1)
+    A = 2.4e-24 if ctx.A is None else ctx.A
 
     # Peclet Number
-    Pe = m.adot*m.H/(k/(const.rho*Cp))
+    Pe = ctx.Pe
     # Strain Heating
     S = 2.*A**(-1./const.n)*(m.eps_xy)**((const.n+1.)/const.n)
     if verbose:
         print('Perol; A:',A, 'S:',S)
-    # Empty Array for Temperatures, then loop through all z's
-    T = np.empty_like(m.z)
-    for i in range(len(m.z)):
-        # Two functions to be integrated
-        def f1(lam):
-            return (1.-np.exp(-lam*Pe*m.z[i]**2./(2.*m.H**2.)))/(2.*lam*np.sqrt(1.-lam))
-        def f2(lam):
-            return (1.-np.exp(-lam*Pe/2.))/(2.*lam*np.sqrt(1.-lam))
-        # Calculate temperature profile
-        T[i] = m.pmp[0] + (m.Ts-m.pmp[0])*erf(np.sqrt(Pe/2.)*(m.z[i]/m.H))/erf(np.sqrt(Pe/2.)) - \
-            S*m.H**2./(k*Pe) * (quad(f1,0.,1.)[0] - \
-            (erf(np.sqrt(Pe/2.)*(m.z[i]/m.H))/erf(np.sqrt(Pe/2.))) * quad(f2,0.,1.)[0])
+    # Substituting lam = 1-u**2 removes the 1/sqrt(1-lam) singularity
+    # so that the integrands are smooth in u
+    if Pe <= _Pe_gl:
+        lam = (1.-_u_gl**2.)[:,None]
+        # Two integrals, the first evaluated for all z's at once
+        I1 = _w_gl@(-np.expm1(-lam*Pe*m.z[None,:]**2./(2.*m.H**2.))/lam)
+        I2 = _w_gl@(-np.expm1(-lam[:,0]*Pe/2.)/lam[:,0])
+    else:
+        # integrand is too sharp near u=1 for the fixed rule, integrate adaptively
+        # with one vector-valued quadrature over all z's and the full thickness
+        a = np.append(Pe*m.z**2./(2.*m.H**2.),Pe/2.)
+        I = quad_vec(lambda u: -np.expm1(-a*(1.-u**2.))/(1.-u**2.),0.,1.)[0]
+        I1,I2 = I[:-1],I[-1]
+    # Calculate temperature profile
+    erf_z = erf(np.sqrt(Pe/2.)*(m.z/m.H))/erf(np.sqrt(Pe/2.))
+    T = m.pmp[0] + (m.Ts-m.pmp[0])*erf_z - S*m.H**2./(k*Pe) * (I1 - erf_z*I2)
     return T
@@ -12,9 +12,10 @@ Earth and Space Sciences
 July 29, 2019
 """
 
+import os
 import numpy as np
 
-from scipy.interpolate import interp1d
+from functools import lru_cache
 
 from ..constants import constantsHotPointDrill
 const = constantsHotPointDrill()
@@ -30,25 +31,48 @@ def C_pbv(C,rho_solute):
     pbv = C/rho_solute
     return pbv
 
-def C_Molality(C,rho_solute,mmass_solute,const=const):
+def C_all(C,rho_solute,mmass_solute,const=const):
     """
-    Dimensional conversion from concentration (kg solute/m3 solution) to molality (mole solute/kg solvent)
+    Dimensional conversion from concentration (kg solute/m3 solution) to all of
+    percent by volume, percent by mass, molality, and mole fraction at once,
+    sharing the solution density between them
+
+    Output
+    ---------
+    pbv: float
+        percent by volume (m3 solute/m3 solution)
+    pbm: float
+        percent by mass (kg solute/kg solution)
+    molality: float
+        molality (mole solute/kg solvent)
+    Xe: float
+        mole fraction (mole solute/mole solution)
+    rhos: float
+        solution density (kg m-3)
     """
     # calculate the density of the solution
     rhos = C + const.rhow*(1.-C/rho_solute)
+    pbv = C/rho_solute
+    pbm = C/rhos
     # calculate the molality of the solution (mole/kg)
     molality = 1000.*C/(mmass_solute*(rhos-C))
+    # calculate the mole fraction
+    hold = C*const.mmass_w/(mmass_solute*rhos)
+    Xe = hold/(1.-pbm+hold)
+    return pbv,pbm,molality,Xe,rhos
+
+def C_Molality(C,rho_solute,mmass_solute,const=const):
+    """
+    Dimensional conversion from concentration (kg solute/m3 solution) to molality (mole solute/kg solvent)
+    """
+    molality = C_all(C,rho_solute,mmass_solute,const)[2]
     return molality
 
 def C_MoleFrac(C,rho_solute,mmass_solute,const=const):
     """
     Dimensional conversion from concentration (kg solute/m3 solution) to mole fraction (mole solute/mole solution)
     """
-    # calculate the density of the solution
-    rhos = C + const.rhow*(1.-C/rho_solute)
-    # calculate the mole fraction
-    hold = C*const.mmass_w/(mmass_solute*rhos)
-    Xe = hold/(1.-C/rhos+hold)
+    Xe = C_all(C,rho_solute,mmass_solute,const)[3]
     return Xe
 
 def C_pbm(C,rho_solute,const=const):
@@ -72,8 +96,8 @@ def pbm_C(pbm,rho_solute,const=const):
     """
     Dimensional conversion from percent by mass (kg solute/kg solution) to concentration (kg solute/m3 solution)
     """
-    rhos = 1./((1./rho_solute)*pbm+(1./const.rhow)*(1.-pbm))
-    C = pbm*rhos
+    # C = pbm*rhos, with the solution density 1/rhos = pbm/rho_solute + (1-pbm)/rhow
+    C = pbm/(pbm/rho_solute+(1.-pbm)/const.rhow)
     return C
 
 # -----------------------------------------------------------------------
@@ -84,10 +108,10 @@ def molDiff(T,eta_s,r=.22e-9,const=const):
 
     Parameters
     ----------
-    C: float
-        solution concentration (kg m-3)
-    T: float
+    T: float or array
         solution temperature (K)
+    eta_s: float or array
+        solution viscosity (Pa s)
     r: float; optional
         particle radius (m)
     const: class; optional
@@ -98,8 +122,7 @@ def molDiff(T,eta_s,r=.22e-9,const=const):
         molecular diffusivity (m2 s-1)
     """
     # if not in K, convert
-    if T < 200:
-        T += const.Tf0
+    T = np.where(np.asarray(T) < 200., T + const.Tf0, T)
     # Molecular diffusivity
     D = const.kBoltz*T/(6.*r*np.pi*eta_s)
     return D
@@ -113,9 +136,9 @@ def etaKhattab(Xe,T,const=const):
 
     Parameters
     ----------
-    Xe: float
+    Xe: float or array
         mole fraction ethanol
-    T: float
+    T: float or array
         solution temperature (K)
     const: class; optional
 
@@ -126,17 +149,16 @@ def etaKhattab(Xe,T,const=const):
     """
 
     # if not in K, convert
-    if T < 200:
-        T += const.Tf0
+    T = np.where(np.asarray(T) < 200., T + const.Tf0, T)
     # calculate water and ethanol viscosity (Vogel Equation)
     etaw = (1/1000.)*np.exp(-3.7188+(578.919/(-137.546+T)))
     etae = (1/1000.)*np.exp(-7.37146+(2770.25/(74.6787+T)))
     # Fraction water
     Xw = 1.-Xe
-    # viscosity
-    eta_s = np.exp(Xw*np.log(etaw)+Xe*np.log(etae)+\
-            724.652*(Xw*Xe/T)+729.357*(Xw*Xe*(Xw-Xe)/T)+\
-            976.050*(Xw*Xe*(Xw-Xe)**2./T))
+    # viscosity, ideal mixing of the log viscosities with a correction in Xw*Xe/T
+    u = Xw*Xe/T
+    d = Xw-Xe
+    eta_s = etaw**Xw * etae**Xe * np.exp(u*(724.652+d*(729.357+976.050*d)))
     return eta_s
 
 def Tf_depression(C,solute='methanol',linear=False,data_dir=None,const=const):
@@ -169,26 +191,43 @@ def Tf_depression(C,solute='methanol',linear=False,data_dir=None,const=const):
         if solute=='methanol':
             # Get percent by mass
             PBM = C_pbm(C,const.rhom)
-            # industrial solvents handbook, percent by mass
-            Tfd = np.load(data_dir+'methanol_freezingdepression_PBM.npy')
         elif solute=='ethanol':
             # Get percent by mass
             PBM = C_pbm(C,const.rhoe)
-            # industrial solvents handbook, percent by mass
-            Tfd = np.load(data_dir+'ethanol_freezingdepression_PBM.npy')
         # linear interpolation between points
-        Tfd_interp = interp1d(Tfd[0], Tfd[1])
-        Tf = Tfd_interp(PBM)
+        Tf = _Tf_interp(PBM,data_dir,solute)
         return Tf
 
+@lru_cache(maxsize=None)
+def _Tf_data(data_dir,solute):
+    """
+    Load the empirical freezing point depression for a solute
+    Cached so that repeated calls do not reload the data from disk,
+    data_dir should be an absolute path so that the cache follows the file
+    """
+    # industrial solvents handbook, percent by mass
+    Tfd = np.load(os.path.join(data_dir,solute+'_freezingdepression_PBM.npy'))
+    return Tfd
+
+def _Tf_interp(pbm,data_dir,solute):
+    """
+    Linear interpolation of the freezing point depression table
+    Raises a ValueError outside the table range rather than extrapolating
+    """
+    Tfd = _Tf_data(os.path.abspath(data_dir),solute)
+    if np.any(pbm < Tfd[0][0]) or np.any(pbm > Tfd[0][-1]):
+        raise ValueError('Percent by mass is outside the range of the freezing point depression data.')
+    Tf = np.interp(pbm,Tfd[0],Tfd[1])
+    return Tf
+
 def Hmix(C,solute='methanol',const=const):
     """
-    Enthalpy of mixing for aqueous ethanol
+    Enthalpy of mixing for aqueous ethanol or methanol
     Peeters and Huyskens (1993) Journal of Molecular Structure
 
     Parameters
     ----------
-    C: float
+    C: float or array
         concentration (kg m-3)
     solute: string; default='methanol'
         label for the solute {'ethanol';'methanol'}
@@ -202,21 +241,81 @@ def Hmix(C,solute='methanol',const=const):
         energy density (J m-3)
     """
     if solute=='methanol':
-        # mole fraction
-        Xe = C_MoleFrac(C,const.rhom,const.mmass_m)
-        Xw = 1.-Xe
+        rho_s,mmass_s = const.rhom,const.mmass_m
+    elif solute=='ethanol':
+        rho_s,mmass_s = const.rhoe,const.mmass_e
+    # mole fraction
+    Xe = C_MoleFrac(C,rho_s,mmass_s,const)
+    H = _Hmix_Xe(Xe,solute)
+    phi = H*C/(mmass_s/1000.)                           # Energy density (J m-3)
+    return H,phi
+
+def _Hmix_Xe(Xe,solute):
+    """
+    Enthalpy of mixing (J mol-1) from the solute mole fraction
+    Peeters and Huyskens (1993) eq. 9
+    """
+    if solute=='methanol':
         # empirical equation constants
         c61 = -5.1
         c11 = -3.4
         c12 = 0.5
     elif solute=='ethanol':
-        # mole fraction
-        Xe = C_MoleFrac(C,const.rhoe,const.mmass_e)
-        Xw = 1.-Xe
         # empirical equation constants
         c61 = -10.6
         c11 = -1.2
         c12 = 0.1
-    H = 1000.*(c61*Xw**6.*Xe+c11*Xw*Xe+c12*Xw*Xe**2.)      # Enthalpy of mixing (J/mol); Peeters and Huyskens (1993) eq. 9
-    phi = H*C/(const.mmass_e/1000.)                     # Energy density (J m-3)
-    return H,phi
+    Xw = 1.-Xe
+    Xw2 = Xw*Xw
+    # c61*Xw**6*Xe + c11*Xw*Xe + c12*Xw*Xe**2 with the common Xw*Xe factored out
+    H = 1000.*Xw*Xe*(c11+c12*Xe+c61*Xw2*Xw2*Xw)
+    return H
+
+# -----------------------------------------------------------------------
+
+def solution_properties(C,T,solute='methanol',data_dir=None,const=const):
+    """
+    Solution properties over a concentration array, computed in one pass
+    so that the solution density and mole fraction are shared between
+    the freezing point depression, viscosity, and enthalpy of mixing
+
+    Parameters
+    ----------
+    C: float or array
+        concentration (kg m-3)
+    T: float or array
+        solution temperature (K)
+    solute: string; default='methanol'
+        label for the solute {'ethanol';'methanol'}
+    data_dir: string; optional
+        directory with the freezing point depression data
+    const: class; optional
+
+    Output
+    ---------
+    props: dict
+        'rhos': solution density (kg m-3)
+        'pbm': percent by mass (kg solute/kg solution)
+        'Xe': mole fraction (mole solute/mole solution)
+        'Tf': freezing point depression (K), as in Tf_depression
+        'eta': solution viscosity (Pa s), as in etaKhattab; the Khattab model
+               is for aqueous ethanol only, so this is None for methanol
+        'H': enthalpy of mixing (J mol-1), as in Hmix
+    """
+    if data_dir is None:
+        data_dir='./data/'
+    if solute=='methanol':
+        rho_s,mmass_s = const.rhom,const.mmass_m
+    elif solute=='ethanol':
+        rho_s,mmass_s = const.rhoe,const.mmass_e
+    C = np.asarray(C,dtype=float)
+    pbv,pbm,molality,Xe,rhos = C_all(C,rho_s,mmass_s,const)
+    props = {'rhos': rhos,
+             'pbm': pbm,
+             'Xe': Xe,
+             'Tf': _Tf_interp(pbm,data_dir,solute),
+             'eta': None,
+             'H': _Hmix_Xe(Xe,solute)}
+    if solute=='ethanol':
+        props['eta'] = etaKhattab(Xe,T,const)
+    return props
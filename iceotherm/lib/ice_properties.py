@@ -91,12 +91,14 @@ def rate_factor(T,const=constants(),
     A:      array,  Rate Factor, viscosity = A^(-1/n)/2
     """
 
-    # create an array for activation energies
-    Qact = const.Qminus*np.ones_like(T)
+    # activation energies, only create an array if T is an array
     if hasattr(T,'__len__'):
+        Qact = const.Qminus*np.ones_like(T)
         Qact[T>-10.] = const.Qplus
     elif T>-10.:
         Qact = const.Qplus
+    else:
+        Qact = const.Qminus
     # Overburden pressure
     if z is not None:
         pmp = const.rho*const.g*(H-z)*const.beta
@@ -18,6 +18,7 @@ import unittest
 from iceotherm.lib.constants import constants
 const = constants()
 from iceotherm.lib.analytical_solutions import *
+from iceotherm.lib.analytical_solutions import _gaussian_integral
 from iceotherm.lib.numerical_model import ice_temperature
 
 class TestAnalyticalSolutions(unittest.TestCase):
@@ -41,6 +42,16 @@ class TestAnalyticalSolutions(unittest.TestCase):
         T,M = Robin_T(m,verbose=True)
         self.assertTrue(np.all(T>-51.))
         self.assertTrue(np.all(T<1.))
+        self.assertAlmostEqual(T[0],m.pmp[0])
+        self.assertTrue(M>0.)
+
+    def test_gaussian_integral(self):
+        from scipy.integrate import quad
+        z = np.linspace(0.,2000.,11)
+        for q2 in [1e-7,-1e-7,0.]:
+            F = _gaussian_integral(z,q2)
+            F_quad = np.array([quad(lambda x: np.exp(-q2*x**2.),0.,zi)[0] for zi in z])
+            self.assertTrue(np.allclose(F,F_quad))
 
     def test_rezvan(self):
         Ts = -50.
@@ -95,5 +106,58 @@ class TestAnalyticalSolutions(unittest.TestCase):
         self.assertTrue(np.all(T>-51.))
         self.assertTrue(np.all(T<=0.))
 
+    def test_perol_quadrature(self):
+        from scipy.integrate import quad
+        from scipy.special import erf
+        # one model on the fixed Gauss-Legendre rule and one on the adaptive fallback
+        for adot in [.1,40.]:
+            m = ice_temperature(Ts=-50.,H=3000.,adot=adot,eps_xy=0.01)
+            ctx = thermal_context(m,T_bulk='average')
+            T = Perol_T(m,ctx=ctx)
+            # reference from the original integrands at each depth
+            Pe = ctx.Pe
+            S = 2.*ctx.A**(-1./const.n)*(m.eps_xy)**((const.n+1.)/const.n)
+            f2 = lambda lam: (1.-np.exp(-lam*Pe/2.))/(2.*lam*np.sqrt(1.-lam))
+            I2 = quad(f2,0.,1.)[0]
+            T_quad = np.empty_like(m.z)
+            for i,zi in enumerate(m.z):
+                f1 = lambda lam: (1.-np.exp(-lam*Pe*zi**2./(2.*m.H**2.)))/(2.*lam*np.sqrt(1.-lam))
+                erf_z = erf(np.sqrt(Pe/2.)*(zi/m.H))/erf(np.sqrt(Pe/2.))
+                T_quad[i] = m.pmp[0] + (m.Ts-m.pmp[0])*erf_z - \
+                        S*m.H**2./(ctx.k*Pe) * (quad(f1,0.,1.)[0] - erf_z*I2)
+            self.assertTrue(np.allclose(T,T_quad,rtol=0.,atol=1e-6))
+
+    def test_thermal_context(self):
+        Ts = -50.
+        H = 1000.
+        adot = .1
+        eps_xy = 0.01
+        m = ice_temperature(Ts=Ts,H=H,adot=adot,eps_xy=eps_xy)
+        ctx = thermal_context(m,T_bulk='average')
+        self.assertTrue(np.allclose(Robin_T(m,ctx=ctx)[0],Robin_T(m,T_bulk='average')[0]))
+        self.assertTrue(np.allclose(Meyer_T(m,ctx=ctx),Meyer_T(m)))
+        self.assertTrue(np.allclose(Perol_T(m,ctx=ctx),Perol_T(m)))
+        self.assertTrue(np.allclose(Rezvan_T(m,ctx=ctx),Rezvan_T(m,T_bulk='average')))
+
+        # properties against the ice property functions called directly
+        T_bulk = (Ts+m.pmp[0])/2.
+        k = conductivity(T_bulk,const.rho)
+        Cp = heat_capacity(T_bulk)
+        self.assertAlmostEqual(ctx.alpha,k/(const.rho*Cp))
+        self.assertAlmostEqual(ctx.Pe,m.adot*H*const.rho*Cp/k)
+        self.assertAlmostEqual(ctx.A/rate_factor(T_bulk,const),1.)
+
+        # the rate factor is not evaluated unless a solver needs it
+        def no_rate_factor(T,const):
+            raise AssertionError('rate factor should not be evaluated')
+        ctx = thermal_context(m,T_bulk='average',rate_factor=no_rate_factor)
+        Robin_T(m,ctx=ctx)
+
+        # constant properties leave A unset so Rezvan uses Astar
+        ctx = thermal_context(m,T_bulk=None,rate_factor=no_rate_factor)
+        self.assertIsNone(ctx.A)
+        self.assertAlmostEqual(ctx.alpha,const.k/(const.rho*const.Cp))
+        self.assertTrue(np.allclose(Rezvan_T(m,ctx=ctx),Rezvan_T(m,T_bulk=None)))
+
 if __name__ == '__main__':
     unittest.main()
@@ -12,6 +12,8 @@ Earth and Space Sciences
 September 9, 2019
 """
 
+import os
+import numpy as np
 import unittest
 
 from iceotherm.lib.constants import constantsHotPointDrill
@@ -31,6 +33,15 @@ class TestConcentrationFunctions(unittest.TestCase):
         pbm_Molality(molality,const.mmass_e)
         pbm_C(pbm,const.rhoe)
 
+    def test_all(self):
+        C = 400.
+        pbv,pbm,molality,Xe,rhos = C_all(C,const.rhoe,const.mmass_e)
+
+        self.assertAlmostEqual(pbv,C_pbv(C,const.rhoe))
+        self.assertAlmostEqual(pbm,C_pbm(C,const.rhoe))
+        self.assertAlmostEqual(molality,pbm_Molality(pbm,const.mmass_e))
+        self.assertAlmostEqual(rhos,C/pbm)
+
     def test_pbm(self):
         pbm = .5
         C = pbm_C(pbm,const.rhoe)
@@ -56,6 +67,17 @@ class TestConcentrationFunctions(unittest.TestCase):
         self.assertLess(D,1e-7)
         self.assertGreater(D,1e-15)
 
+    def test_molecular_diffusivity_array(self):
+        T = np.array([-10.,263.15])
+        C = np.array([400.,400.])
+        Xe = C_MoleFrac(C,const.rhoe,const.mmass_e)
+        eta_s = etaKhattab(Xe,T)
+        D = molDiff(T,eta_s)
+
+        self.assertAlmostEqual(eta_s[0],eta_s[1])
+        self.assertAlmostEqual(D[0],D[1])
+        self.assertEqual(T[0],-10.)
+
     def test_freezing_depression(self):
         C = 400.
 
@@ -67,6 +89,23 @@ class TestConcentrationFunctions(unittest.TestCase):
 
         self.assertNotEqual(Tf_e,Tf_m)
 
+        with self.assertRaises(ValueError):
+            Tf_depression(-10.)
+        with self.assertRaises(ValueError):
+            Tf_depression(2000.)
+        with self.assertRaises(ValueError):
+            solution_properties(np.array([400.,2000.]),-10.,solute='ethanol')
+
+        # the cached table follows the working directory for relative paths
+        cwd = os.getcwd()
+        try:
+            os.chdir('./data/')
+            with self.assertRaises(FileNotFoundError):
+                Tf_depression(C)
+            self.assertEqual(Tf_depression(C,data_dir='./'),Tf_m)
+        finally:
+            os.chdir(cwd)
+
     def test_enthalpy_of_mixing(self):
         C = 400.
 
@@ -75,9 +114,31 @@ class TestConcentrationFunctions(unittest.TestCase):
 
         H_m,phi_m = Hmix(C)
         self.assertLess(H_m,0.)
+        self.assertAlmostEqual(phi_m,H_m*C/(const.mmass_m/1000.))
+        self.assertAlmostEqual(phi_e,H_e*C/(const.mmass_e/1000.))
 
         self.assertNotEqual(H_e,H_m)
 
+        C = np.array([100.,400.])
+        H,phi = Hmix(C,solute='ethanol')
+        self.assertAlmostEqual(H[1],H_e)
+        self.assertTrue(np.all(phi<0.))
+
+    def test_solution_properties(self):
+        C = np.array([100.,400.])
+        T = -10.
+        props = solution_properties(C,T,solute='ethanol')
+
+        self.assertTrue(np.allclose(props['Tf'],Tf_depression(C,solute='ethanol')))
+        self.assertTrue(np.allclose(props['H'],Hmix(C,solute='ethanol')[0]))
+        self.assertTrue(np.allclose(props['eta'],etaKhattab(props['Xe'],T)))
+        self.assertTrue(np.allclose(props['pbm'],C_pbm(C,const.rhoe)))
+
+        # no viscosity model for aqueous methanol
+        props = solution_properties(C,T)
+        self.assertIsNone(props['eta'])
+        self.assertTrue(np.allclose(props['Tf'],Tf_depression(C)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -58,6 +58,8 @@ class TestIceProperties(unittest.TestCase):
         A = rate_factor(T,const=const)
         self.assertTrue(A[0]>1e-28)
         self.assertTrue(A[0]<1e-23)
+        self.assertAlmostEqual(rate_factor(T[0],const=const)/A[0],1.)
+        self.assertAlmostEqual(rate_factor(-5.,const=const)/rate_factor(np.array([-5.]),const=const)[0],1.)
 
         tau_xz = const.rho*const.g*(H-m.z)*abs(0.03)
         A = rate_factor(T,z=m.z,H=H,const=const,tau_xz=tau_xz,v_surf=v_surf)